@@ -1,82 +1,316 @@
 import asyncio
-import json
+import atexit
 import logging
 import os
+import queue
 import secrets
+import sys
+import time
 import uuid
+from contextlib import asynccontextmanager
+from logging.handlers import QueueHandler, QueueListener
 
-import aiofiles
 import httpx
 import msal
+import orjson
+import redis.asyncio as redis
+import requests
 from dotenv import load_dotenv
 from fastapi import FastAPI, HTTPException, Request
+from fastapi.middleware.gzip import GZipMiddleware
 from fastapi.responses import (FileResponse, JSONResponse, RedirectResponse,
                                StreamingResponse)
 from fastapi.staticfiles import StaticFiles
-from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.datastructures import MutableHeaders
+from starlette.requests import cookie_parser
 
 from keyvault import get_secret
 
 load_dotenv()
 
-app = FastAPI()
-
 # Logging configuration
+# Records go through a queue to a listener thread, so handler I/O never blocks the event loop.
+_log_queue = queue.SimpleQueue()
+_log_listener = QueueListener(_log_queue, logging.StreamHandler())
 logging.getLogger('azure').setLevel(logging.WARNING)
-logging.basicConfig(level=os.environ.get('LOGLEVEL', 'DEBUG').upper(), force=True)
+logging.basicConfig(level=os.environ.get('LOGLEVEL', 'DEBUG').upper(), handlers=[QueueHandler(_log_queue)], force=True)
+_log_listener.start()
+atexit.register(_log_listener.stop)
 logging.getLogger("uvicorn.error").propagate = True
 logging.getLogger("uvicorn.access").propagate = True
 
 # -------------------------------
-# File-based Session Middleware using request.state
+# Session Configuration
+# -------------------------------
+# "memory" (default, single worker), "redis" (multi-worker) or "file"
+SESSION_STORE = os.getenv("SESSION_STORE", "memory").lower()
+SESSION_REDIS_URL = os.getenv("SESSION_REDIS_URL", "redis://localhost:6379/0")
+SESSION_DIR = os.getenv("SESSION_DIR", "sessions")
+SESSION_MAX_AGE = int(os.getenv("SESSION_MAX_AGE", 86400))
+SESSION_SWEEP_INTERVAL = 60
+SESSION_ID_POOL_SIZE = 1024
+
+# -------------------------------
+# Session Stores
 # -------------------------------
-class FileSessionMiddleware(BaseHTTPMiddleware):
-    def __init__(self, app, session_dir: str = "sessions", cookie_name: str = "session_id", max_age: int = 86400):
-        super().__init__(app)
+class MemorySessionStore:
+    """Keeps sessions in process memory, evicting entries idle for longer than max_age."""
+    def __init__(self, max_age: int):
+        self.max_age = max_age
+        # session_id -> (last write time, session data)
+        self.sessions: dict[str, tuple[float, dict]] = {}
+
+    async def get(self, session_id: str) -> dict:
+        entry = self.sessions.get(session_id)
+        if entry is None or time.monotonic() - entry[0] > self.max_age:
+            return {}
+        return entry[1]
+
+    async def set(self, session_id: str, session_data: dict):
+        self.sessions[session_id] = (time.monotonic(), session_data)
+
+    async def sweep(self):
+        cutoff = time.monotonic() - self.max_age
+        expired = [sid for sid, (written_at, _) in self.sessions.items() if written_at < cutoff]
+        for sid in expired:
+            del self.sessions[sid]
+
+class RedisSessionStore:
+    """Shares sessions between workers through Redis; keys expire via SETEX."""
+    def __init__(self, url: str, max_age: int):
+        self.redis = redis.from_url(url)
+        self.max_age = max_age
+
+    async def get(self, session_id: str) -> dict:
+        content = await self.redis.get(f"session:{session_id}")
+        if content is None:
+            return {}
+        try:
+            return orjson.loads(content)
+        except Exception as e:
+            logging.error(f"Error decoding session data: {e}")
+            return {}
+
+    async def set(self, session_id: str, session_data: dict):
+        await self.redis.setex(f"session:{session_id}", self.max_age, orjson.dumps(session_data))
+
+    async def sweep(self):
+        pass
+
+class FileSessionStore:
+    """Persists each session as a JSON file in session_dir.
+
+    Each read or write is a single worker-thread call, and writes are atomic (temp file + rename).
+    """
+    def __init__(self, session_dir: str):
         self.session_dir = session_dir
+        os.makedirs(session_dir, exist_ok=True)
+
+    @staticmethod
+    def _read(session_file: str):
+        try:
+            with open(session_file, mode="rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    @staticmethod
+    def _write(session_file: str, content: bytes):
+        tmp_file = f"{session_file}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_file, mode="wb") as f:
+            f.write(content)
+        os.replace(tmp_file, session_file)
+
+    async def get(self, session_id: str) -> dict:
+        session_file = os.path.join(self.session_dir, f"{session_id}.json")
+        content = await asyncio.to_thread(self._read, session_file)
+        if content is None:
+            return {}
+        try:
+            return orjson.loads(content)
+        except Exception as e:
+            logging.error(f"Error decoding session file: {e}")
+            return {}
+
+    async def set(self, session_id: str, session_data: dict):
+        session_file = os.path.join(self.session_dir, f"{session_id}.json")
+        await asyncio.to_thread(self._write, session_file, orjson.dumps(session_data))
+
+    async def sweep(self):
+        pass
+
+def _build_session_store():
+    if SESSION_STORE == "redis":
+        return RedisSessionStore(SESSION_REDIS_URL, SESSION_MAX_AGE)
+    if SESSION_STORE == "file":
+        return FileSessionStore(SESSION_DIR)
+    return MemorySessionStore(SESSION_MAX_AGE)
+
+session_store = _build_session_store()
+
+# -------------------------------
+# Session IDs
+# -------------------------------
+# Filled in the background so new sessions do not each wait on an OS entropy read.
+_session_id_pool: asyncio.Queue = asyncio.Queue(maxsize=SESSION_ID_POOL_SIZE)
+
+async def _fill_session_id_pool():
+    while True:
+        # One entropy read per 64 ids; put() waits while the pool is full.
+        batch = secrets.token_bytes(16 * 64)
+        for i in range(0, len(batch), 16):
+            await _session_id_pool.put(batch[i:i + 16].hex())
+
+def _new_session_id():
+    try:
+        return _session_id_pool.get_nowait()
+    except asyncio.QueueEmpty:
+        return secrets.token_hex(16)
+
+# -------------------------------
+# Session Middleware using request.state
+# -------------------------------
+class TrackedDict(dict):
+    """dict that records whether it was modified, so unchanged sessions are not written back."""
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._dirty = False
+
+    def __setitem__(self, key, value):
+        self._dirty = True
+        super().__setitem__(key, value)
+
+    def __delitem__(self, key):
+        self._dirty = True
+        super().__delitem__(key)
+
+    def pop(self, key, *args):
+        if key in self:
+            self._dirty = True
+        return super().pop(key, *args)
+
+    def popitem(self):
+        self._dirty = True
+        return super().popitem()
+
+    def clear(self):
+        if self:
+            self._dirty = True
+        super().clear()
+
+    def update(self, *args, **kwargs):
+        self._dirty = True
+        super().update(*args, **kwargs)
+
+    def setdefault(self, key, default=None):
+        if key not in self:
+            self._dirty = True
+        return super().setdefault(key, default)
+
+class SessionMiddleware:
+    """Pure ASGI session middleware; avoids the extra task and streams BaseHTTPMiddleware adds per request."""
+    def __init__(self, app, store, cookie_name: str = "session_id", max_age: int = SESSION_MAX_AGE,
+                 excluded_prefixes: tuple = ("/static/", "/favicon.ico")):
+        self.app = app
+        self.store = store
+        # Public assets never touch the session, so they skip the store entirely.
+        self.excluded_prefixes = excluded_prefixes
         self.cookie_name = cookie_name
         self.max_age = max_age
-        os.makedirs(session_dir, exist_ok=True)
 
-    async def dispatch(self, request: Request, call_next):
-        session_id = request.cookies.get(self.cookie_name)
-        if session_id:
-            session_file = os.path.join(self.session_dir, f"{session_id}.json")
-            if os.path.exists(session_file):
-                async with aiofiles.open(session_file, mode="r") as f:
-                    content = await f.read()
-                    try:
-                        session_data = json.loads(content)
-                    except Exception as e:
-                        logging.error(f"Error decoding session file: {e}")
-                        session_data = {}
-            else:
-                session_data = {}
-        else:
-            session_data = {}
+    def _get_session_id(self, scope):
+        for name, value in scope["headers"]:
+            if name == b"cookie":
+                return cookie_parser(value.decode("latin-1")).get(self.cookie_name)
+        return None
 
-        # Instead of assigning to request.session, we assign to request.state.session.
-        request.state.session = session_data
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"].startswith(self.excluded_prefixes):
+            await self.app(scope, receive, send)
+            return
 
-        response = await call_next(request)
+        session_id = self._get_session_id(scope)
+        session_data = await self.store.get(session_id) if session_id else {}
 
-        # If no session_id exists, create one and set it as a cookie.
-        if not session_id:
-            session_id = secrets.token_hex(16)
-            response.set_cookie(
-                key=self.cookie_name,
-                value=session_id,
-                max_age=self.max_age,
-                httponly=True,
-                samesite="lax"
-            )
+        # If no session_id exists, create one now so handlers can key per-session state on it.
+        is_new = not session_id
+        if is_new:
+            session_id = _new_session_id()
 
-        session_file = os.path.join(self.session_dir, f"{session_id}.json")
-        async with aiofiles.open(session_file, mode="w") as f:
-            await f.write(json.dumps(request.state.session))
-        return response
+        # Instead of assigning to request.session, we assign to request.state.session.
+        session = TrackedDict(session_data)
+        state = scope.setdefault("state", {})
+        state["session"] = session
+        state["session_id"] = session_id
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                # Handlers are done with the session once the response starts, so write it back now
+                # (only if changed) rather than after a possibly long or abandoned streamed body.
+                if is_new or session._dirty:
+                    await self.store.set(session_id, session)
+                if is_new:
+                    headers = MutableHeaders(scope=message)
+                    headers.append(
+                        "set-cookie",
+                        f"{self.cookie_name}={session_id}; HttpOnly; Max-Age={self.max_age}; Path=/; SameSite=lax"
+                    )
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
 
-app.add_middleware(FileSessionMiddleware)
+# -------------------------------
+# Response Compression
+# -------------------------------
+class StreamAwareGZipMiddleware(GZipMiddleware):
+    """GZipMiddleware that leaves streaming endpoints alone, so their chunks are not held back by compression."""
+    def __init__(self, app, excluded_paths=("/speak",), **kwargs):
+        super().__init__(app, **kwargs)
+        self.excluded_paths = excluded_paths
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["path"] in self.excluded_paths:
+            await self.app(scope, receive, send)
+            return
+        await super().__call__(scope, receive, send)
+
+async def _sweep_sessions():
+    while True:
+        await asyncio.sleep(SESSION_SWEEP_INTERVAL)
+        try:
+            await session_store.sweep()
+            _sweep_msal_apps()
+            _sweep_groups_cache()
+            _sweep_token_cache()
+        except Exception as e:
+            logging.error(f"Error sweeping sessions: {e}")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # One pooled client for short outbound calls (Graph, Speech).
+    app.state.http = httpx.AsyncClient(
+        timeout=httpx.Timeout(60.0, connect=5.0),
+        limits=httpx.Limits(max_keepalive_connections=100, max_connections=200),
+        http2=True
+    )
+    # Orchestrator streams hold a connection for their whole duration, so they get their own pool
+    # and cannot starve the client above. Reads never time out, but waiting for a free connection does.
+    app.state.stream_http = httpx.AsyncClient(
+        timeout=httpx.Timeout(None, connect=5.0, pool=STREAMING_POOL_TIMEOUT),
+        limits=httpx.Limits(max_keepalive_connections=STREAMING_MAX_CONNECTIONS, max_connections=STREAMING_MAX_CONNECTIONS)
+    )
+    sweeper = asyncio.create_task(_sweep_sessions())
+    session_id_filler = asyncio.create_task(_fill_session_id_pool())
+    yield
+    sweeper.cancel()
+    session_id_filler.cancel()
+    await app.state.http.aclose()
+    await app.state.stream_http.aclose()
+
+app = FastAPI(lifespan=lifespan)
+# Added first so it sits inside the session middleware, which sets cookies on the uncompressed response start.
+app.add_middleware(StreamAwareGZipMiddleware, minimum_size=1024, compresslevel=6)
+app.add_middleware(SessionMiddleware, store=session_store)
 
 # -------------------------------
 # Authentication Configuration
@@ -87,7 +321,7 @@ AUTHORITY = os.getenv("AUTHORITY", "https://login.microsoftonline.com/your_tenan
 REDIRECT_PATH = os.getenv("REDIRECT_PATH", "/getAToken")
 REDIRECT_URI = os.getenv("REDIRECT_URI", f"http://localhost:8000{REDIRECT_PATH}")
 BASIC_SCOPE = ["User.Read"]
-OTHER_AUTH_SCOPES = os.getenv("OTHER_AUTH_SCOPES", "")
+OTHER_AUTH_SCOPES = [s.strip() for s in os.getenv("OTHER_AUTH_SCOPES", "").split(",") if s.strip()]
 
 # -------------------------------
 # Authentication Secrets
@@ -100,18 +334,59 @@ AZURE_SPEECH_API_KEY = get_secret("avatarSpeechApiKey")
 if not FUNCTION_KEY:
     raise Exception("FUNCTION_KEY not found in KeyVault.")
 
+# -------------------------------
+# Azure Speech Configuration
+# -------------------------------
+AZURE_SPEECH_REGION = os.getenv("AZURE_SPEECH_REGION", "eastus2")
+SUPPORTED_LANGUAGES = [lang.strip() for lang in os.getenv("SUPPORTED_LANGUAGES", "en-US,de-DE,zh-CN,nl-NL").split(",")]
+# Payloads of the configuration endpoints never change while the process runs.
+_SPEECH_REGION_CONTENT = {"speech_region": AZURE_SPEECH_REGION}
+_SUPPORTED_LANGUAGES_CONTENT = {"supported_languages": SUPPORTED_LANGUAGES}
+_SPEECH_TOKEN_URL = f"https://{AZURE_SPEECH_REGION}.api.cognitive.microsoft.com/sts/v1.0/issueToken"
+_ICE_TOKEN_URL = f"https://{AZURE_SPEECH_REGION}.tts.speech.microsoft.com/cognitiveservices/avatar/relay/token/v1"
+_SPEECH_HEADERS = {"Ocp-Apim-Subscription-Key": AZURE_SPEECH_API_KEY}
+
+# -------------------------------
+# Orchestrator Configuration
+# -------------------------------
+STREAMING_ENDPOINT = os.getenv("STREAMING_ENDPOINT", "http://localhost:7071/api/orcstream")
+STREAMING_MAX_CONNECTIONS = int(os.getenv("STREAMING_MAX_CONNECTIONS", 200))
+STREAMING_POOL_TIMEOUT = 10.0
+_SPEAK_HEADERS = {
+    "x-functions-key": FUNCTION_KEY,
+    "Content-Type": "application/json"
+}
+
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
 # -------------------------------
 # MSAL Helper Functions (using request.state.session)
 # -------------------------------
+# Shared by every MSAL app so authority (OIDC metadata) discovery is fetched once, not per construction.
+_MSAL_HTTP_CACHE = {}
+# Shared by every MSAL app so per-session apps do not each keep their own connection pool.
+# Mirrors MSAL's default client: a requests.Session with a single retry.
+_MSAL_HTTP_CLIENT = requests.Session()
+_MSAL_HTTP_CLIENT.mount("http://", requests.adapters.HTTPAdapter(max_retries=1))
+_MSAL_HTTP_CLIENT.mount("https://", requests.adapters.HTTPAdapter(max_retries=1))
+_MSAL_APP = None
+
 def _build_msal_app(cache=None):
-    return msal.ConfidentialClientApplication(
+    # Apps without a per-session cache are interchangeable, so one is built and reused.
+    global _MSAL_APP
+    if cache is None and _MSAL_APP is not None:
+        return _MSAL_APP
+    msal_app = msal.ConfidentialClientApplication(
         CLIENT_ID,
         authority=AUTHORITY,
         client_credential=MSAL_CLIENT_SECRET,
-        token_cache=cache
+        token_cache=cache,
+        http_client=_MSAL_HTTP_CLIENT,
+        http_cache=_MSAL_HTTP_CACHE
     )
+    if cache is None:
+        _MSAL_APP = msal_app
+    return msal_app
 
 def _build_auth_url(state: str):
     msal_app = _build_msal_app()
@@ -121,6 +396,10 @@ def _build_auth_url(state: str):
         redirect_uri=REDIRECT_URI
     )
 
+# session_id -> (last use time, serialized cache the app matches, MSAL app holding the live token
+# cache), so neither the app nor the cache is rebuilt on every request
+MSAL_APPS: dict[str, tuple[float, str, msal.ConfidentialClientApplication]] = {}
+
 def _load_cache(request: Request):
     cache = msal.SerializableTokenCache()
     if "msal_cache" in request.state.session:
@@ -130,22 +409,89 @@ def _load_cache(request: Request):
             logging.error(f"Error deserializing cache: {e}")
     return cache
 
+def _load_msal_app(request: Request):
+    session_id = request.state.session_id
+    entry = MSAL_APPS.get(session_id)
+    serialized_cache = request.state.session.get("msal_cache")
+    # The live app is only reused while it matches the session's serialized cache. Any other change
+    # (logout, a new sign-in or a refresh handled by another worker) rebuilds it from the session.
+    if entry and serialized_cache is not None and entry[1] == serialized_cache:
+        msal_app = entry[2]
+    else:
+        msal_app = _build_msal_app(cache=_load_cache(request))
+    MSAL_APPS[session_id] = (time.monotonic(), serialized_cache, msal_app)
+    return msal_app
+
 def _save_cache(request: Request, cache):
+    # The live cache is kept in MSAL_APPS; the session copy is only refreshed when MSAL changed it.
     if cache.has_state_changed:
-        request.state.session["msal_cache"] = cache.serialize()
+        serialized_cache = cache.serialize()
+        request.state.session["msal_cache"] = serialized_cache
+        entry = MSAL_APPS.get(request.state.session_id)
+        if entry and entry[2].token_cache is cache:
+            MSAL_APPS[request.state.session_id] = (entry[0], serialized_cache, entry[2])
+
+def _sweep_msal_apps():
+    cutoff = time.monotonic() - SESSION_MAX_AGE
+    expired = [sid for sid, (used_at, _, _) in MSAL_APPS.items() if used_at < cutoff]
+    for sid in expired:
+        del MSAL_APPS[sid]
+
+# Tokens are reused until TOKEN_EXPIRY_MARGIN seconds before they expire.
+TOKEN_EXPIRY_MARGIN = 60
+# (oid, scopes) -> (expiry time, access token)
+_TOKEN_CACHE: dict[tuple[str, frozenset[str]], tuple[float, str]] = {}
+# One lock per (oid, scopes) so concurrent requests share a single MSAL lookup
+_TOKEN_LOCKS: dict[tuple[str, frozenset[str]], asyncio.Lock] = {}
+
+def _get_cached_token(key):
+    cached = _TOKEN_CACHE.get(key)
+    if cached and cached[0] > time.monotonic() + TOKEN_EXPIRY_MARGIN:
+        return cached[1]
+    return None
+
+def _acquire_token_silent(msal_app, scopes: list, oid: str):
+    # Only use the signed-in user's account, so a token cached under this oid is always theirs.
+    account = next((a for a in msal_app.get_accounts() if a.get("local_account_id") == oid), None)
+    if not account:
+        return None
+    return msal_app.acquire_token_silent(scopes, account=account)
 
 async def get_valid_access_token(request: Request, scopes: list):
-    cache = _load_cache(request)
-    msal_app = _build_msal_app(cache=cache)
-    accounts = msal_app.get_accounts()
-    account = accounts[0] if accounts else None
-    result = msal_app.acquire_token_silent(scopes, account=account)
-    if not result or "access_token" not in result:
-        raise Exception("Could not refresh token silently: no token found in cache.")
-    if "error" in result:
-        raise Exception(result.get("error_description", "Could not refresh token silently."))
-    _save_cache(request, cache)
-    return result.get("access_token")
+    user = request.state.session.get("user") or {}
+    oid = user.get("oid")
+    key = (oid or request.state.session_id, frozenset(scopes))
+    access_token = _get_cached_token(key)
+    if access_token:
+        return access_token
+    async with _TOKEN_LOCKS.setdefault(key, asyncio.Lock()):
+        access_token = _get_cached_token(key)
+        if access_token:
+            return access_token
+        msal_app = _load_msal_app(request)
+        # A silent refresh may call the token endpoint; keep it off the event loop.
+        result = await asyncio.to_thread(_acquire_token_silent, msal_app, scopes, oid)
+        if not result or "access_token" not in result:
+            raise Exception("Could not refresh token silently: no token found in cache.")
+        if "error" in result:
+            raise Exception(result.get("error_description", "Could not refresh token silently."))
+        _save_cache(request, msal_app.token_cache)
+        access_token = result.get("access_token")
+        _TOKEN_CACHE[key] = (time.monotonic() + result.get("expires_in", 3600), access_token)
+    return access_token
+
+def _forget_tokens(oid: str):
+    # Process-local: with several workers, the other workers keep the user's cached tokens after
+    # logout until they expire.
+    for key in [key for key in _TOKEN_CACHE if key[0] == oid]:
+        del _TOKEN_CACHE[key]
+
+def _sweep_token_cache():
+    now = time.monotonic()
+    for key in [key for key, (expires_at, _) in _TOKEN_CACHE.items() if expires_at < now]:
+        del _TOKEN_CACHE[key]
+    for key in [key for key, lock in _TOKEN_LOCKS.items() if not lock.locked() and key not in _TOKEN_CACHE]:
+        del _TOKEN_LOCKS[key]
 
 # -------------------------------
 # Authentication Endpoints
@@ -173,8 +519,7 @@ async def authorized(request: Request):
     code = request.query_params.get("code")
     if not code:
         return JSONResponse(content={"error": "Authorization code not found"}, status_code=400)
-    cache = _load_cache(request)
-    msal_app = _build_msal_app(cache=cache)
+    msal_app = _load_msal_app(request)
     result = msal_app.acquire_token_by_authorization_code(
         code,
         scopes=BASIC_SCOPE,
@@ -193,28 +538,102 @@ async def authorized(request: Request):
     request.state.session["user"] = minimal_user
     request.state.session["graph_access_token"] = result.get("access_token")
     request.state.session["refresh_token"] = result.get("refresh_token")
-    _save_cache(request, cache)
+    _save_cache(request, msal_app.token_cache)
     request.state.session.pop("state", None)
     return RedirectResponse(url="/", status_code=303)
 
 @app.get("/logout")
 async def logout(request: Request):
+    user = request.state.session.get("user")
+    if user:
+        _forget_tokens(user.get("oid"))
     request.state.session.clear()
+    MSAL_APPS.pop(request.state.session_id, None)
     logout_url = f"{AUTHORITY}/oauth2/v2.0/logout?post_logout_redirect_uri={REDIRECT_URI}"
     return RedirectResponse(url=logout_url, status_code=303)
 
+# -------------------------------
+# Graph Group Lookup (cached per user)
+# -------------------------------
+GROUPS_TTL = 300
+# oid -> (fetch time, group names)
+GROUPS_CACHE: dict[str, tuple[float, list[str]]] = {}
+# One lock per oid so concurrent cache misses result in a single Graph call
+_GROUPS_LOCKS: dict[str, asyncio.Lock] = {}
+
+async def _fetch_groups(client: httpx.AsyncClient, graph_access_token: str):
+    graph_headers = {"Authorization": f"Bearer {graph_access_token}"}
+    graph_url = "https://graph.microsoft.com/v1.0/me/memberOf"
+    response = await client.get(graph_url, headers=graph_headers)
+    response.raise_for_status()
+    group_data = response.json()
+    return [g.get("displayName", "missing-group") for g in group_data.get("value", [])]
+
+def _get_cached_groups(oid: str):
+    cached = GROUPS_CACHE.get(oid)
+    if cached and time.monotonic() - cached[0] < GROUPS_TTL:
+        return cached[1]
+    return None
+
+async def get_user_groups(request: Request, oid: str, graph_access_token: str):
+    client = request.app.state.http
+    if not oid:
+        return await _fetch_groups(client, graph_access_token)
+    groups = _get_cached_groups(oid)
+    if groups is not None:
+        return groups
+    async with _GROUPS_LOCKS.setdefault(oid, asyncio.Lock()):
+        groups = _get_cached_groups(oid)
+        if groups is None:
+            groups = await _fetch_groups(client, graph_access_token)
+            GROUPS_CACHE[oid] = (time.monotonic(), groups)
+    return groups
+
+def _sweep_groups_cache():
+    cutoff = time.monotonic() - GROUPS_TTL
+    expired = [oid for oid, (fetched_at, _) in GROUPS_CACHE.items() if fetched_at < cutoff]
+    for oid in expired:
+        del GROUPS_CACHE[oid]
+    for oid in [oid for oid, lock in _GROUPS_LOCKS.items() if not lock.locked() and oid not in GROUPS_CACHE]:
+        del _GROUPS_LOCKS[oid]
+
 # -------------------------------
 # Authorization Check (Extra Token Handling)
 # -------------------------------
+async def _refresh_session_token(request: Request, scopes: list, session_key: str, description: str):
+    """Refreshes a token into the session, falling back to the last stored one on failure."""
+    try:
+        access_token = await get_valid_access_token(request, scopes)
+    except Exception as ex:
+        logging.error(f"Failed to refresh {description}: {str(ex)}")
+        return request.state.session.get(session_key, None)
+    # Avoid marking the session dirty (and rewriting it) when the token did not change.
+    if request.state.session.get(session_key) != access_token:
+        request.state.session[session_key] = access_token
+    return access_token
+
+async def _get_graph_token_and_groups(request: Request, oid: str):
+    graph_access_token = await _refresh_session_token(request, BASIC_SCOPE, "graph_access_token", "Graph token")
+    groups = []
+    if graph_access_token:
+        try:
+            groups = await get_user_groups(request, oid, graph_access_token)
+        except Exception as e:
+            logging.info(f"Failed to get user groups from Graph API: {e}")
+    return graph_access_token, groups
+
+# Returned for every request when authentication is disabled; callers must treat it as read-only.
+_UNAUTH_INFO = {
+    "authorized": True,
+    "client_principal_id": "no-auth",
+    "client_principal_name": "anonymous",
+    "client_group_names": [],
+    "access_token": None
+}
+
 async def check_authorization(request: Request):
     if not ENABLE_AUTHENTICATION:
-        return {
-            "authorized": True,
-            "client_principal_id": "no-auth",
-            "client_principal_name": "anonymous",
-            "client_group_names": [],
-            "access_token": None
-        }
+        return _UNAUTH_INFO
     user = request.state.session.get("user")
     if not user:
         logging.info("No user in session; user not authenticated.")
@@ -227,34 +646,16 @@ async def check_authorization(request: Request):
         }
     client_principal_id = user.get("oid")
     client_principal_name = user.get("preferred_username") or user.get("upn")
-    try:
-        graph_access_token = await get_valid_access_token(request, BASIC_SCOPE)
-        request.state.session["graph_access_token"] = graph_access_token
-    except Exception as ex:
-        logging.error(f"Failed to refresh Graph token: {str(ex)}")
-        graph_access_token = request.state.session.get("graph_access_token", None)
-    other_access_token = None
+    # The group lookup only needs the Graph token, so it overlaps with the other-scope refresh.
     if OTHER_AUTH_SCOPES:
-        try:
-            scopes = [s.strip() for s in OTHER_AUTH_SCOPES.split(",") if s.strip()]
-            other_access_token = await get_valid_access_token(request, scopes)
-            request.state.session["other_access_token"] = other_access_token
-        except Exception as ex:
-            logging.error(f"Failed to refresh token for other scopes: {str(ex)}")
-            other_access_token = request.state.session.get("other_access_token", None)
+        (graph_access_token, groups), other_access_token = await asyncio.gather(
+            _get_graph_token_and_groups(request, client_principal_id),
+            _refresh_session_token(request, OTHER_AUTH_SCOPES, "other_access_token", "token for other scopes")
+        )
+    else:
+        graph_access_token, groups = await _get_graph_token_and_groups(request, client_principal_id)
+        other_access_token = None
     access_token = other_access_token if other_access_token else graph_access_token
-    groups = []
-    if graph_access_token:
-        try:
-            graph_headers = {"Authorization": f"Bearer {graph_access_token}"}
-            graph_url = "https://graph.microsoft.com/v1.0/me/memberOf"
-            async with httpx.AsyncClient() as client:
-                response = await client.get(graph_url, headers=graph_headers)
-                response.raise_for_status()
-                group_data = response.json()
-                groups = [g.get("displayName", "missing-group") for g in group_data.get("value", [])]
-        except Exception as e:
-            logging.info(f"Failed to get user groups from Graph API: {e}")
     return {
         "authorized": True,
         "client_principal_id": client_principal_id,
@@ -273,9 +674,7 @@ async def serve_index(request: Request):
     return FileResponse("static/index.html")
 
 @app.get("/favicon.ico")
-async def serve_favicon(request: Request):
-    if ENABLE_AUTHENTICATION and not request.state.session.get("user"):
-        return RedirectResponse(url="/login", status_code=303)
+async def serve_favicon():
     return FileResponse("static/image/favicon.ico")
 
 @app.post("/speak")
@@ -285,7 +684,7 @@ async def speak(request: Request):
     conversation_id = body.get("conversation_id", "")
     if not question:
         raise HTTPException(status_code=400, detail="Missing spokenText in request.")
-    auth_info = await check_authorization(request)
+    auth_info = await check_authorization(request) if ENABLE_AUTHENTICATION else _UNAUTH_INFO
     if not auth_info.get("authorized"):
         return JSONResponse(
             content={
@@ -306,82 +705,85 @@ async def speak(request: Request):
     }
     if access_token:
         payload["access_token"] = access_token
-    headers = {
-        "x-functions-key": FUNCTION_KEY,
-        "Content-Type": "application/json"
-    }
+    client = request.app.state.stream_http
     async def stream_generator():
-        logging.info("Sending request to streaming endpoint with payload: %s", payload)
-        async with httpx.AsyncClient(timeout=None) as client:
+        logging.info("Sending request to streaming endpoint for conversation: %s", conversation_id)
+        try:
             async with client.stream(
                 "POST",
-                os.getenv("STREAMING_ENDPOINT", "http://localhost:7071/api/orcstream"),
-                json=payload,
-                headers=headers
+                STREAMING_ENDPOINT,
+                content=orjson.dumps(payload),
+                headers=_SPEAK_HEADERS
             ) as resp:
                 logging.info("Received response with status code: %s", resp.status_code)
                 if resp.status_code != 200:
                     yield f"Error: {resp.status_code}"
                     return
-                last_yield = asyncio.get_event_loop().time()
-                hearbeatcount = 0
+                monotonic = asyncio.get_running_loop().time
+                last_yield = monotonic()
+                heartbeat_count = 0
+                # One whole decoded line per yield: chat.js decodes each chunk on its own and
+                # treats a whitespace-only chunk as the end of a spoken sentence.
                 async for line in resp.aiter_lines():
-                    now = asyncio.get_event_loop().time()
+                    now = monotonic()
                     if now - last_yield > 15:
                         # Yield heartbeat to keep connection alive
-                        hearbeatcount += 1
-                        logging.info("Yelding heartbeat ", hearbeatcount)
+                        heartbeat_count += 1
+                        logging.info("Yielding heartbeat %d", heartbeat_count)
                         yield ":\n\n"  # SSE comment heartbeat
                         last_yield = now
                     if line:
-                        logging.info("Received line from stream: %s", line)
                         yield line
                         last_yield = now
+        except httpx.PoolTimeout:
+            # Every streaming connection is busy; fail fast instead of waiting indefinitely.
+            logging.error("Timed out waiting for a free connection to the streaming endpoint.")
+            yield "Error: 503"
 
     return StreamingResponse(stream_generator(), media_type="text/event-stream")
 
 @app.get("/get-speech-token")
-async def get_speech_token():
-    speech_region = os.getenv("AZURE_SPEECH_REGION", "eastus2")
-    subscription_key = AZURE_SPEECH_API_KEY
-    if not subscription_key:
+async def get_speech_token(request: Request):
+    if not AZURE_SPEECH_API_KEY:
         raise HTTPException(status_code=400, detail="Missing Azure Speech subscription key.")
-    token_url = f"https://{speech_region}.api.cognitive.microsoft.com/sts/v1.0/issueToken"
-    async with httpx.AsyncClient() as client:
-        headers = {"Ocp-Apim-Subscription-Key": subscription_key}
-        response = await client.post(token_url, headers=headers)
-        if response.status_code == 200:
-            return JSONResponse(content={"token": response.text})
-        else:
-            raise HTTPException(status_code=response.status_code, detail="Failed to get speech token.")
+    response = await request.app.state.http.post(_SPEECH_TOKEN_URL, headers=_SPEECH_HEADERS)
+    if response.status_code == 200:
+        return JSONResponse(content={"token": response.text})
+    else:
+        raise HTTPException(status_code=response.status_code, detail="Failed to get speech token.")
 
 @app.get("/get-ice-server-token")
-async def get_ice_server_token():
-    speech_region = os.getenv("AZURE_SPEECH_REGION", "eastus2")
-    subscription_key = AZURE_SPEECH_API_KEY
-    if not subscription_key:
+async def get_ice_server_token(request: Request):
+    if not AZURE_SPEECH_API_KEY:
         raise HTTPException(status_code=400, detail="Missing Azure Speech subscription key.")
-    token_url = f"https://{speech_region}.tts.speech.microsoft.com/cognitiveservices/avatar/relay/token/v1"
-    async with httpx.AsyncClient() as client:
-        headers = {"Ocp-Apim-Subscription-Key": subscription_key}
-        response = await client.get(token_url, headers=headers)
-        if response.status_code == 200:
-            return JSONResponse(content=response.json())
-        else:
-            raise HTTPException(status_code=response.status_code, detail="Failed to get ICE server token.")
+    response = await request.app.state.http.get(_ICE_TOKEN_URL, headers=_SPEECH_HEADERS)
+    if response.status_code == 200:
+        return JSONResponse(content=response.json())
+    else:
+        raise HTTPException(status_code=response.status_code, detail="Failed to get ICE server token.")
 
 @app.get("/get-speech-region")
 async def get_speech_region():
-    speech_region = os.getenv("AZURE_SPEECH_REGION", "eastus2")
-    return JSONResponse(content={"speech_region": speech_region})
+    return JSONResponse(content=_SPEECH_REGION_CONTENT)
 
 @app.get("/get-supported-languages")
 async def get_supported_languages():
-    supported_languages = os.getenv("SUPPORTED_LANGUAGES", "en-US,de-DE,zh-CN,nl-NL")
-    languages_list = [lang.strip() for lang in supported_languages.split(",")]
-    return JSONResponse(content={"supported_languages": languages_list})
+    return JSONResponse(content=_SUPPORTED_LANGUAGES_CONTENT)
 
 if __name__ == "__main__":
     import uvicorn
     port = int(os.environ.get("PORT", 8000))
-    uvicorn.run("main:app", host="0.0.0.0", port=port, reload=True)
+    dev = os.environ.get("DEV", "").lower() in ("1", "true")
+    uvicorn.run(
+        "main:app",
+        host="0.0.0.0",
+        port=port,
+        # uvloop is not available on Windows
+        loop="asyncio" if sys.platform == "win32" else "uvloop",
+        http="httptools",
+        reload=dev,
+        # More than one worker requires SESSION_STORE="redis"
+        workers=None if dev else int(os.environ.get("WORKERS", 1)),
+        limit_concurrency=1000,
+        timeout_keep_alive=30
+    )